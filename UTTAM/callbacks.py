@@ -2,6 +2,7 @@
 
 from pyrogram.types import CallbackQuery
 from main import save_user_data, get_user_data, add_text_to_image, convert_to_jpg, get_adjustment_keyboard
+from font_registry import registry as font_registry
 from random import randint
 import os
 
@@ -45,16 +46,8 @@ async def handle_callback(_, callback_query: CallbackQuery):
         user_data['blur_radius'] = max(user_data['blur_radius'] - 1, 0)  # Prevent going below 0
     elif callback_query.data == "blur_increase":
         user_data['blur_radius'] += 1  # Increase blur radius
-    elif callback_query.data == "font_deadly_advance_italic":
-        user_data['font'] = "fonts/Deadly Advance Italic (1).ttf"
-    elif callback_query.data == "font_deadly_advance":
-        user_data['font'] = "fonts/Deadly Advance.ttf"
-    elif callback_query.data == "font_trick_or_treats":
-        user_data['font'] = "fonts/Trick or Treats.ttf"
-    elif callback_query.data == "font_vampire_wars_italic":
-        user_data['font'] = "fonts/Vampire Wars Italic.ttf"
-    elif callback_query.data == "font_lobster":
-        user_data['font'] = "fonts/FIGHTBACK.ttf"
+    elif font_registry.button_font(callback_query.data):
+        user_data['font'] = font_registry.button_font(callback_query.data)
     elif callback_query.data == "download_jpg":
         # Convert the current final image to JPG and send it
         final_image_path = await add_text_to_image(user_data['photo_path'], user_data['text'], user_data['font'], user_data['text_position'], user_data['size_multiplier'], user_data['text_color'], user_data['blur_radius'])
@@ -77,7 +70,7 @@ async def handle_callback(_, callback_query: CallbackQuery):
     await save_user_data(user_id, user_data)
 
     # Regenerate the logo with the new adjustments
-    font_path = user_data.get("font", "fonts/Deadly Advance.ttf")  # Default to Deadly Advance font if no font is set
+    font_path = user_data.get("font", font_registry.default_font)  # Default to the registry's default font if no font is set
     output_path = await add_text_to_image(user_data['photo_path'], user_data['text'], font_path, user_data['text_position'], user_data['size_multiplier'], user_data['text_color'], user_data['blur_radius'])
 
     if output_path is None:
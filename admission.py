@@ -0,0 +1,166 @@
+"""
+Module: admission
+
+This module bounds the render work the bot accepts: a global queue with a
+concurrency cap and a memory budget estimated from pixel counts, which
+serves downloads before previews, and a per-user token bucket rate limit.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Lower values are served first
+PRIORITY_DOWNLOAD = 0
+PRIORITY_PREVIEW = 1
+
+# Decoded RGB source, blurred copy and RGBA composite held at once while rendering
+BYTES_PER_PIXEL = 12
+
+
+@lru_cache(maxsize=1024)
+def _photo_size(photo_path, mtime_ns):
+    # Only the header is read; the pixels are not decoded
+    with Image.open(photo_path) as image:
+        return image.size
+
+
+def estimate_render_bytes(photo_path, preview, preview_max_side):
+    """Estimate the peak memory of rendering photo_path.
+
+    Previews are decoded in draft mode, which yields at most twice the
+    preview size per side, so their estimate is capped accordingly.
+    """
+
+    try:
+        width, height = _photo_size(photo_path, os.stat(photo_path).st_mtime_ns)
+    except OSError as e:
+        logger.warning(f"Could not read size of {photo_path}: {e}")
+        return 0
+    if preview and max(width, height) > 2 * preview_max_side:
+        scale = 2 * preview_max_side / max(width, height)
+        width, height = math.ceil(width * scale), math.ceil(height * scale)
+    return width * height * BYTES_PER_PIXEL
+
+
+class AdmissionController:
+    """Global render queue with a concurrency cap and a memory budget.
+
+    A job is admitted when fewer than `max_concurrent` jobs run and its
+    estimated memory fits in what is left of `max_bytes`; a job is always
+    admitted when nothing else runs, so an oversized photo still renders.
+    Waiting jobs are admitted strictly in (priority, arrival) order.
+
+    Each user also has a token bucket refilling `rate` tokens per second up
+    to `burst`; take_token() spends one token per render.
+    """
+
+    def __init__(self, max_concurrent, max_bytes, rate, burst):
+        self.max_concurrent = max_concurrent
+        self.max_bytes = max_bytes
+        self.rate = rate
+        self.burst = burst
+        self.running = 0
+        self.reserved_bytes = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._buckets = {}
+
+    def take_token(self, user_id):
+        """Spend one of the user's tokens and return 0, or return the seconds until one is available."""
+
+        now = time.monotonic()
+        tokens, last = self._buckets.get(user_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        allowed = tokens >= 1
+        self._buckets[user_id] = (tokens - 1 if allowed else tokens, now)
+        if len(self._buckets) > 4096:
+            self._prune_buckets(now)
+        return 0 if allowed else (1 - tokens) / self.rate
+
+    def _prune_buckets(self, now):
+        # A bucket that has refilled completely is the same as no bucket
+        self._buckets = {
+            user_id: (tokens, last)
+            for user_id, (tokens, last) in self._buckets.items()
+            if tokens + (now - last) * self.rate < self.burst
+        }
+
+    def saturated(self):
+        """Whether a new job would have to wait."""
+
+        return bool(self._waiters) or self.running >= self.max_concurrent
+
+    def position(self, priority):
+        """Queue position a new job of this priority would get."""
+
+        return 1 + sum(1 for waiter in self._waiters if waiter[0] <= priority)
+
+    def waiting(self, priority=None):
+        """Number of queued jobs, optionally of one priority only."""
+
+        # Snapshot: the metrics thread calls this while the event loop changes the queue
+        return sum(1 for waiter in list(self._waiters) if priority is None or waiter[0] == priority)
+
+    def _fits(self, nbytes):
+        if self.running >= self.max_concurrent:
+            return False
+        return self.running == 0 or self.reserved_bytes + nbytes <= self.max_bytes
+
+    def _acquire(self, nbytes):
+        self.running += 1
+        self.reserved_bytes += nbytes
+
+    def _release(self, nbytes):
+        self.running -= 1
+        self.reserved_bytes -= nbytes
+        self._admit_waiters()
+
+    def _admit_waiters(self):
+        while self._waiters:
+            _, _, nbytes, future = self._waiters[0]
+            if future.done():
+                # Cancelled while queued
+                heapq.heappop(self._waiters)
+                continue
+            if not self._fits(nbytes):
+                return
+            heapq.heappop(self._waiters)
+            self._acquire(nbytes)
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority, nbytes):
+        """Hold a render slot for the enclosed block, waiting for admission."""
+
+        if not self._waiters and self._fits(nbytes):
+            self._acquire(nbytes)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            waiter = (priority, next(self._sequence), nbytes, future)
+            heapq.heappush(self._waiters, waiter)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Admitted just before the cancellation arrived
+                    self._release(nbytes)
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    heapq.heapify(self._waiters)
+                    self._admit_waiters()
+                raise
+        try:
+            yield
+        finally:
+            self._release(nbytes)
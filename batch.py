@@ -0,0 +1,150 @@
+"""
+Module: batch
+
+This module renders logos without Telegram. It exposes the blur -> text ->
+encode pipeline as a library API and as a command line tool that reads one
+JSON job per line:
+
+    {"photo": "backgrounds/wood.jpg", "text": "Hello", "font": "Lobster-Regular.ttf",
+     "color": "red", "position": [40, 60], "size_multiplier": 1.2, "blur": 4}
+
+    python batch.py jobs.jsonl -o out/
+
+Jobs are spread over all cores. Each worker process keeps its decoded
+backgrounds and loaded fonts, so they are reused across jobs. One JSON
+status line is printed per finished job.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+from PIL import ImageColor
+
+import render
+from config import Config
+from font_registry import registry as font_registry
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_font(font):
+    """Accept a font path or a file name inside the fonts directory.
+
+    Raises ValueError if the font does not exist or cannot be used, so the
+    job fails instead of silently rendering with the default font.
+    """
+
+    if not os.path.isfile(font):
+        font = os.path.join(font_registry.fonts_dir, font)
+    if not os.path.isfile(font):
+        raise ValueError(f"font not found: {font}")
+    return font_registry.register(font)
+
+
+def parse_job(job):
+    """Validate a job dict and return the render_logo arguments for it."""
+
+    if not job.get("photo") or not job.get("text"):
+        raise ValueError("a job needs a 'photo' and a 'text'")
+    position = job.get("position", (0, 0))
+    return (
+        job["photo"],
+        int(job.get("blur", 0)),
+        job["text"],
+        resolve_font(job.get("font") or font_registry.default_font),
+        (int(position[0]), int(position[1])),
+        float(job.get("size_multiplier", 1)),
+        ImageColor.getrgb(job.get("color", "red")),
+    )
+
+
+def output_name(index, job):
+    if job.get("output"):
+        return job["output"]
+    stem = os.path.splitext(os.path.basename(job.get("photo", "logo")))[0]
+    return f"{index:05d}-{stem}.png"
+
+
+async def render_jobs(jobs, output_dir, engine, concurrency=None):
+    """Render jobs into output_dir, yielding a status dict per finished job.
+
+    Results are yielded in completion order; at most `concurrency` jobs are
+    queued on the engine at once.
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+    limit = asyncio.Semaphore(concurrency or engine.max_workers * 2)
+
+    async def run(index, job):
+        status = {"job": index}
+        async with limit:
+            started = time.perf_counter()
+            try:
+                args = parse_job(job)
+                output_path = os.path.join(output_dir, output_name(index, job))
+                await engine.run(render.render_logo_file, output_path, *args)
+                status.update(status="ok", output=output_path)
+            except Exception as e:
+                status.update(status="error", error=str(e))
+            status["seconds"] = round(time.perf_counter() - started, 3)
+        return status
+
+    tasks = [asyncio.ensure_future(run(index, job)) for index, job in enumerate(jobs)]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def render_batch(jobs, output_dir, workers=None, on_status=None):
+    """Render jobs on a fresh worker pool and return their status dicts.
+
+    on_status, if given, is called with each status as soon as it is known.
+    """
+
+    async def run():
+        engine = render.RenderEngine(workers or Config.RENDER_WORKERS)
+        statuses = []
+        try:
+            async for status in render_jobs(jobs, output_dir, engine):
+                statuses.append(status)
+                if on_status:
+                    on_status(status)
+        finally:
+            engine.shutdown()
+        return statuses
+
+    return asyncio.run(run())
+
+
+def read_jobs(path):
+    """Read a JSONL job file, skipping blank lines."""
+
+    with open(path, encoding="utf-8") as job_file:
+        return [json.loads(line) for line in job_file if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render logos from a JSONL job file.")
+    parser.add_argument("jobs", help="JSONL file with one job per line")
+    parser.add_argument("-o", "--output-dir", default="output", help="directory for rendered logos")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    def print_status(status):
+        print(json.dumps(status, ensure_ascii=False), flush=True)
+
+    statuses = render_batch(read_jobs(args.jobs), args.output_dir, args.workers, print_status)
+    failed = sum(status["status"] != "ok" for status in statuses)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+Module: benchmark
+
+This module times each stage of the logo rendering pipeline without
+Telegram, using the bundled fonts and backgrounds:
+
+    python benchmark.py -o bench.json
+    python benchmark.py --baseline bench.json --threshold 0.2
+
+Stages (decode, blur at each radius, font sizing, text drawing with outline,
+encoding) run in-process over several image sizes and text lengths. Each
+case reports p50/p95 in milliseconds and the peak RSS seen so far. With
+--baseline the run fails when a case's p50 is slower than the baseline by
+more than the threshold (cases under --min-ms are ignored as noise).
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import PIL
+from PIL import Image, ImageFilter
+
+import render
+
+logger = logging.getLogger(__name__)
+
+BACKGROUNDS_DIR = "backgrounds"
+FONTS_DIR = "fonts"
+IMAGE_SIZES = (640, 1280, 2560, 4000)
+BLUR_RADII = (2, 4, 6, 8, 10)
+DRAW_FONT = os.path.join(FONTS_DIR, "Lobster-Regular.ttf")
+TEXTS = {
+    "short": "Logo",
+    "medium": "Shashank Logo Maker",
+    "long": "The quick brown fox jumps over the lazy dog, again and again",
+}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def time_case(results, name, func, iterations, setup=None):
+    """Run func `iterations` times and record its latency percentiles."""
+
+    samples = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    results[name] = {
+        "p50_ms": round(percentile(samples, 0.5), 3),
+        "p95_ms": round(percentile(samples, 0.95), 3),
+        "iterations": iterations,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print(f"{name:<50} p50 {results[name]['p50_ms']:>9.2f} ms  p95 {results[name]['p95_ms']:>9.2f} ms", flush=True)
+
+
+def make_fixtures(directory):
+    """Write the bundled background resized to each benchmark size.
+
+    The fixtures are derived deterministically from backgrounds/, so runs on
+    different machines time the same pixels.
+    """
+
+    source = sorted(
+        name for name in os.listdir(BACKGROUNDS_DIR) if name.lower().endswith((".jpg", ".jpeg", ".png"))
+    )[0]
+    fixtures = {}
+    with Image.open(os.path.join(BACKGROUNDS_DIR, source)) as image:
+        image = image.convert("RGB")
+        for size in IMAGE_SIZES:
+            height = round(size * image.height / image.width)
+            path = os.path.join(directory, f"background-{size}.jpg")
+            image.resize((size, height), Image.LANCZOS).save(path, "JPEG", quality=90)
+            fixtures[size] = path
+    return fixtures
+
+
+def clear_font_caches():
+    render.load_font.cache_clear()
+    render.text_metrics.cache_clear()
+
+
+def clear_text_caches():
+    clear_font_caches()
+    render.text_masks.cache_clear()
+    render.font_registry.resolve.cache_clear()
+
+
+def run_benchmarks(iterations):
+    results = {}
+    fonts = sorted(
+        os.path.join(FONTS_DIR, name) for name in os.listdir(FONTS_DIR) if name.lower().endswith((".ttf", ".otf"))
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        fixtures = make_fixtures(directory)
+
+        for size, path in fixtures.items():
+            def decode(path=path):
+                with Image.open(path) as image:
+                    image.convert("RGBA")
+
+            time_case(results, f"decode/{size}", decode, iterations)
+
+            with Image.open(path) as image:
+                base = image.convert("RGBA")
+            for radius in BLUR_RADII:
+                time_case(
+                    results, f"blur/r{radius}/{size}",
+                    lambda radius=radius: base.filter(ImageFilter.GaussianBlur(radius=radius)),
+                    iterations,
+                )
+
+            # Cold rasterises the text and dilates its outline; warm pastes the cached masks
+            for label, text in TEXTS.items():
+                draw = lambda text=text: render.draw_text(base.copy(), text, DRAW_FONT, (20, 20), 1, (255, 0, 0))
+                time_case(results, f"text_draw/cold/{label}/{size}", draw, iterations, setup=clear_text_caches)
+                time_case(results, f"text_draw/warm/{label}/{size}", draw, iterations)
+
+            rendered = base.copy()
+            render.draw_text(rendered, TEXTS["medium"], DRAW_FONT, (20, 20), 1, (255, 0, 0))
+            time_case(results, f"encode/jpeg/{size}", lambda: render.encode_image(rendered, preview=True), iterations)
+            time_case(results, f"encode/png/{size}", lambda: render.encode_image(rendered, preview=False), iterations)
+
+        # Font sizing with cold caches measures font parsing; warm measures the cached path
+        for font_path in fonts:
+            name = os.path.basename(font_path)
+            for label, text in TEXTS.items():
+                sizing = lambda text=text, font_path=font_path: render.get_dynamic_font(text, 1280, 960, font_path)
+                time_case(results, f"font_sizing/cold/{name}/{label}", sizing, iterations, setup=clear_font_caches)
+                time_case(results, f"font_sizing/warm/{name}/{label}", sizing, iterations)
+
+    return results
+
+
+def compare(results, baseline, threshold, min_ms):
+    """Return the cases whose p50 regressed by more than threshold.
+
+    Cases faster than min_ms in the baseline are skipped; they are too short
+    to time reliably.
+    """
+
+    regressions = []
+    for name, case in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or previous["p50_ms"] < min_ms:
+            continue
+        change = case["p50_ms"] / previous["p50_ms"] - 1
+        if change > threshold:
+            regressions.append((name, previous["p50_ms"], case["p50_ms"], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the logo rendering stages.")
+    parser.add_argument("-n", "--iterations", type=int, default=10, help="samples per case")
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p50 slowdown, 0.2 = 20%%")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="ignore cases faster than this in the baseline")
+    args = parser.parse_args(argv)
+
+    report = {
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "machine": platform.machine(),
+        "iterations": args.iterations,
+        "results": run_benchmarks(args.iterations),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print(f"peak RSS {report['peak_rss_mb']} MB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            regressions = compare(report["results"], json.load(baseline_file), args.threshold, args.min_ms)
+        for name, before, after, change in regressions:
+            print(f"REGRESSION {name}: {before:.2f} ms -> {after:.2f} ms (+{change:.0%})")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,23 @@
 # button.py
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from font_registry import registry as font_registry
+
+# Color buttons of the adjustment keyboard: (callback data, label, color name)
+COLOR_BUTTONS = (
+    ("color_red", "🔴", "red"),
+    ("color_blue", "🔵", "blue"),
+    ("color_green", "🟢", "green"),
+    ("color_black", "⚫", "black"),
+    ("color_yellow", "🟡", "yellow"),
+    ("color_orange", "🟠", "orange"),
+    ("color_purple", "🟣", "purple"),
+)
+
+def button_color(callback_data):
+    for button_data, _, color in COLOR_BUTTONS:
+        if button_data == callback_data:
+            return color
+    return None
 
 def get_adjustment_keyboard(final_image_path=None):
     buttons = [
@@ -11,27 +29,34 @@ def get_adjustment_keyboard(final_image_path=None):
          InlineKeyboardButton("⛶ –", callback_data="decrease_size")],
         
         # Color selection buttons
-        [InlineKeyboardButton("🔴", callback_data="color_red"),
-         InlineKeyboardButton("🔵", callback_data="color_blue"),
-         InlineKeyboardButton("🟢", callback_data="color_green"),
-         InlineKeyboardButton("⚫", callback_data="color_black"),
-         InlineKeyboardButton("🟡", callback_data="color_yellow"),
-         InlineKeyboardButton("🟠", callback_data="color_orange"),
-         InlineKeyboardButton("🟣", callback_data="color_purple")],
+        [InlineKeyboardButton(label, callback_data=callback_data)
+         for callback_data, label, _ in COLOR_BUTTONS],
         
-        # Font selection buttons
-        [InlineKeyboardButton("🄵ᴀ", callback_data="font_deadly_advance_italic"),
-         InlineKeyboardButton("🄵ʙ", callback_data="font_deadly_advance"),
-         InlineKeyboardButton("🄵ᴄ", callback_data="font_trick_or_treats"),
-         InlineKeyboardButton("🄵ᴅ", callback_data="font_vampire_wars_italic"),
-         InlineKeyboardButton("🄵ᴇ", callback_data="font_lobster")],
+        # Font selection buttons (only fonts the registry could load)
+        [InlineKeyboardButton(label, callback_data=callback_data)
+         for callback_data, label in font_registry.buttons()],
         
         # Blur buttons
         [InlineKeyboardButton("ʙʟᴜʀ +", callback_data="blur_plus"),
          InlineKeyboardButton("ʙʟᴜʀ -", callback_data="blur_minus")],
 
+        # Contact sheet of every font and color
+        [InlineKeyboardButton("ᴀʟʟ sᴛʏʟᴇs", callback_data="preview_all")],
+
         # Always show the Download button
         [InlineKeyboardButton("ᴅᴏᴡɴʟᴏᴀᴅ ʏᴏᴜʀ ʟᴏɢᴏ", callback_data="download_logo")]
     ]
     
     return InlineKeyboardMarkup(buttons)
+
+# Picker for the contact sheet: numbered buttons for its font rows (every registered font) and one
+# row of color buttons for its columns. "pick_font_<n>" and "pick_color_<n>" are indexes into the sheet.
+def get_style_picker_keyboard():
+    font_buttons = [InlineKeyboardButton(str(row + 1), callback_data=f"pick_font_{row}")
+                    for row in range(len(font_registry.paths()))]
+    # Telegram shows at most 8 buttons per row
+    buttons = [font_buttons[start:start + 6] for start in range(0, len(font_buttons), 6)]
+    buttons.append([InlineKeyboardButton(label, callback_data=f"pick_color_{column}")
+                    for column, (_, label, _) in enumerate(COLOR_BUTTONS)])
+    buttons.append([InlineKeyboardButton("↩ ʙᴀᴄᴋ", callback_data="preview_back")])
+    return InlineKeyboardMarkup(buttons)
@@ -6,7 +6,7 @@ such as bot token, API ID and API HASH.
 It also sets up the necessary configuration settings.
 """
 
-from os import getenv
+from os import cpu_count, getenv
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,4 +15,29 @@ class Config:
     API_ID = int(getenv("API_ID", "16457832"))
     API_HASH = getenv("API_HASH", "3030874d0befdb5d05597deacc3e83ab")
     BOT_TOKEN = getenv("BOT_TOKEN", "7576739341:AAGJVdNZm-p6flwS0qnOqnc9bHw1wGJ8nZs")
+    RENDER_WORKERS = int(getenv("RENDER_WORKERS", str(min(2, cpu_count() or 1))))
+    LAYER_CACHE_MB = int(getenv("LAYER_CACHE_MB", "128"))
+    PREVIEW_MAX_SIDE = int(getenv("PREVIEW_MAX_SIDE", "1280"))
+    PREVIEW_JPEG_QUALITY = int(getenv("PREVIEW_JPEG_QUALITY", "85"))
+    OUTLINE_WIDTH = int(getenv("OUTLINE_WIDTH", "3"))
+    OUTLINE_COLOR = getenv("OUTLINE_COLOR", "white")
+    RESULT_CACHE_MB = int(getenv("RESULT_CACHE_MB", "64"))
+    RESULT_CACHE_ENTRIES = int(getenv("RESULT_CACHE_ENTRIES", "10000"))
+    RENDER_DEBOUNCE = float(getenv("RENDER_DEBOUNCE", "0.3"))
+    SESSION_TTL = int(getenv("SESSION_TTL", "3600"))
+    MAX_SESSIONS = int(getenv("MAX_SESSIONS", "500"))
+    SESSION_BACKEND = getenv("SESSION_BACKEND", "memory")
+    SESSION_DB = getenv("SESSION_DB", "sessions.db")
+    SESSION_FLUSH_INTERVAL = float(getenv("SESSION_FLUSH_INTERVAL", "0.5"))
+    MAX_LOOP_LAG = float(getenv("MAX_LOOP_LAG", "2.0"))
+    PHOTO_CACHE_DIR = getenv("PHOTO_CACHE_DIR", "downloads/photos")
+    PHOTO_CACHE_MB = int(getenv("PHOTO_CACHE_MB", "1024"))
+    RENDER_CONCURRENCY = int(getenv("RENDER_CONCURRENCY", str(RENDER_WORKERS)))
+    RENDER_MEMORY_MB = int(getenv("RENDER_MEMORY_MB", "384"))
+    USER_RATE = float(getenv("USER_RATE", "2.0"))
+    USER_BURST = int(getenv("USER_BURST", "6"))
+    PROGRESS_INTERVAL = float(getenv("PROGRESS_INTERVAL", "3.0"))
+    PROGRESS_EDITS_PER_SECOND = float(getenv("PROGRESS_EDITS_PER_SECOND", "10"))
+    CONTACT_SHEET_TILE = int(getenv("CONTACT_SHEET_TILE", "320"))
+    CONTACT_SHEET_GAP = int(getenv("CONTACT_SHEET_GAP", "6"))
     
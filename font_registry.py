@@ -0,0 +1,169 @@
+"""
+Module: font_registry
+
+This module scans the fonts directory once at startup, validates every face,
+keeps the font files in memory and indexes which characters each face can
+render, so text falls back to a covering font instead of drawing boxes.
+"""
+
+import io
+import logging
+import os
+from functools import lru_cache
+
+from fontTools.ttLib import TTFont
+from PIL import ImageFont
+
+logger = logging.getLogger(__name__)
+
+FONTS_DIR = "fonts"
+FONT_EXTENSIONS = (".ttf", ".otf")
+DEFAULT_FONT = "Deadly Advance.ttf"
+
+# Font buttons of the adjustment keyboard: (callback data, label, font file)
+FONT_BUTTONS = (
+    ("font_deadly_advance_italic", "🄵ᴀ", "UTTAM4.otf"),
+    ("font_deadly_advance", "🄵ʙ", "Deadly Advance.ttf"),
+    ("font_trick_or_treats", "🄵ᴄ", "Trick or Treats.ttf"),
+    ("font_vampire_wars_italic", "🄵ᴅ", "UTTAM3.otf"),
+    ("font_lobster", "🄵ᴇ", "FIGHTBACK.ttf"),
+)
+
+
+class FontRegistry:
+    """Validated, preloaded fonts with a glyph coverage index.
+
+    Fonts are keyed by their normalised path relative to the working
+    directory (for example "fonts/Lobster-Regular.ttf"), which is what
+    sessions store; "./fonts/..." or absolute paths name the same font.
+    Font files outside the fonts directory are loaded on first use.
+    """
+
+    def __init__(self, fonts_dir=FONTS_DIR):
+        self.fonts_dir = fonts_dir
+        self._data = {}
+        self._coverage = {}
+        self.scan()
+
+    def scan(self):
+        """Load and validate every font file in the fonts directory."""
+
+        self._data.clear()
+        self._coverage.clear()
+        self.resolve.cache_clear()
+        try:
+            names = sorted(os.listdir(self.fonts_dir))
+        except FileNotFoundError:
+            logger.error(f"Font directory {self.fonts_dir} not found")
+            return
+        for name in names:
+            if not name.lower().endswith(FONT_EXTENSIONS):
+                continue
+            try:
+                self._load(os.path.join(self.fonts_dir, name))
+            except ValueError as e:
+                logger.warning(f"Skipping {e}")
+        logger.info(f"Loaded {len(self._data)} fonts from {self.fonts_dir}")
+
+    def _load(self, font_path):
+        path = _normalize(font_path)
+        try:
+            with open(path, "rb") as font_file:
+                data = font_file.read()
+            # Pillow must be able to render it, and fontTools must be able to read its character map
+            ImageFont.truetype(io.BytesIO(data), 20).getbbox("A")
+            cmap = TTFont(io.BytesIO(data), lazy=True)["cmap"].getBestCmap() or {}
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            raise ValueError(f"unusable font {path}: {e}") from e
+        self._data[path] = data
+        self._coverage[path] = frozenset(cmap)
+        return path
+
+    def register(self, font_path):
+        """Load a font file if it is not registered yet and return its key.
+
+        Raises ValueError if the file is missing or cannot be used.
+        """
+
+        path = _normalize(font_path)
+        if path not in self._data:
+            self._load(path)
+            self.resolve.cache_clear()
+        return path
+
+    def __contains__(self, font_path):
+        return _normalize(font_path) in self._data
+
+    def paths(self):
+        return list(self._data)
+
+    @property
+    def default_font(self):
+        path = os.path.join(self.fonts_dir, DEFAULT_FONT)
+        if path in self._data:
+            return path
+        return next(iter(self._data), path)
+
+    def font_bytes(self, font_path):
+        """In-memory copy of the font file, or None if it is not registered."""
+
+        return self._data.get(_normalize(font_path))
+
+    def missing_glyphs(self, font_path, text):
+        """Characters of text that font_path has no glyph for."""
+
+        coverage = self._coverage.get(_normalize(font_path), frozenset())
+        return {char for char in text if not char.isspace() and ord(char) not in coverage}
+
+    @lru_cache(maxsize=1024)
+    def resolve(self, font_path, text):
+        """Return a registered font able to render text, preferring font_path.
+
+        An existing font file that is not registered yet is loaded; missing
+        or unusable fonts are replaced by the default font. If the preferred
+        font lacks glyphs, the first registered font covering the whole text
+        is used, or failing that the one covering the most of it.
+        """
+
+        font_path = _normalize(font_path)
+        if font_path not in self._data:
+            try:
+                font_path = self.register(font_path)
+            except ValueError as e:
+                logger.warning(f"Font {font_path} cannot be used ({e}), using {self.default_font}")
+                font_path = self.default_font
+        if font_path not in self._data or not self.missing_glyphs(font_path, text):
+            return font_path
+
+        candidates = [font_path] + [path for path in self._data if path != font_path]
+        return min(candidates, key=lambda path: len(self.missing_glyphs(path, text)))
+
+    def buttons(self):
+        """(callback data, label) of the font buttons whose font is usable."""
+
+        return [
+            (callback_data, label)
+            for callback_data, label, name in FONT_BUTTONS
+            if os.path.join(self.fonts_dir, name) in self._data
+        ]
+
+    def button_font(self, callback_data):
+        """Font path selected by a font button, or None."""
+
+        for button_data, _, name in FONT_BUTTONS:
+            if button_data == callback_data:
+                return os.path.join(self.fonts_dir, name)
+        return None
+
+
+def _normalize(font_path):
+    # Relative to the working directory when inside it, absolute otherwise
+    path = os.path.abspath(font_path)
+    if path.startswith(os.getcwd() + os.sep):
+        return os.path.relpath(path)
+    return path
+
+
+# Built once per process at import; render workers fork from a process that
+# already imported it, so the preloaded font files are shared copy-on-write.
+registry = FontRegistry()
@@ -0,0 +1,111 @@
+"""
+Module: ingest
+
+This module downloads background photos into a shared on-disk blob cache
+keyed by Telegram's file_unique_id, so a photo that is resent or forwarded
+by many users is downloaded once.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PhotoIngest:
+    """Deduplicating photo downloader with a size-bounded blob cache.
+
+    Concurrent requests for the same file_unique_id share one download.
+    Blobs are evicted least recently used first once the cache grows past
+    `max_bytes`. Blobs that a live session points at are never deleted,
+    however old: `in_use` is an async callable returning their paths, and
+    should ask the session store, which every bot process shares.
+    """
+
+    def __init__(self, directory, max_bytes, in_use):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.in_use = in_use
+        self.hits = 0
+        self.misses = 0
+        self.collapsed = 0
+        self._downloads = {}
+        self._last_used = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, file_unique_id):
+        return os.path.join(self.directory, f"{file_unique_id}.jpg")
+
+    def touch(self, path):
+        """Mark a blob as recently used, so eviction removes it last.
+
+        Recency is kept in memory rather than in the file's mtime, which the
+        render layer cache uses to detect changed files.
+        """
+
+        self._last_used[os.path.abspath(path)] = time.time()
+
+    async def fetch(self, message, progress=None, progress_args=()):
+        """Return the local path of the message's photo, downloading it at most once."""
+
+        file_unique_id = message.photo.file_unique_id
+        path = self.path_for(file_unique_id)
+        if os.path.exists(path):
+            self.hits += 1
+            self.touch(path)
+            return path
+
+        download = self._downloads.get(file_unique_id)
+        if download is not None:
+            self.collapsed += 1
+        else:
+            self.misses += 1
+            download = asyncio.ensure_future(self._download(message, path, progress, progress_args))
+            self._downloads[file_unique_id] = download
+            download.add_done_callback(lambda _: self._downloads.pop(file_unique_id, None))
+        # Shield so one cancelled waiter does not cancel the download for the others
+        return await asyncio.shield(download)
+
+    async def _download(self, message, path, progress, progress_args):
+        # Pyrogram writes to a temporary file and moves it into place when complete.
+        # It returns the final path, which is where the photo really is.
+        path = await message.download(file_name=path, progress=progress, progress_args=progress_args)
+        if not path:
+            raise RuntimeError(f"Download of {message.photo.file_unique_id} did not complete")
+        await self.evict(keep=path)
+        return path
+
+    async def evict(self, keep=None):
+        """Delete least recently used blobs until the cache fits max_bytes.
+
+        Blobs of live sessions and `keep` (a photo about to be handed to a
+        new session) are skipped.
+        """
+
+        protected = {os.path.abspath(path) for path in await self.in_use() if path}
+        if keep:
+            protected.add(os.path.abspath(keep))
+        blobs = []
+        total = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    last_used = max(stat.st_mtime, self._last_used.get(entry.path, 0))
+                    blobs.append((last_used, stat.st_size, entry.path))
+                    total += stat.st_size
+        for _, size, path in sorted(blobs):
+            if total <= self.max_bytes:
+                break
+            if path in protected:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+                self._last_used.pop(path, None)
+            except OSError as e:
+                logger.warning(f"Could not evict {path}: {e}")
+        if total > self.max_bytes:
+            logger.warning(f"Photo cache holds {total} bytes, over its limit, in photos of live sessions")
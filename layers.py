@@ -0,0 +1,124 @@
+"""
+Module: layers
+
+This module keeps decoded and blurred background layers in memory so that
+text-only edits can be composited onto an existing layer instead of
+decoding and blurring the photo again.
+"""
+
+import logging
+import math
+import os
+from collections import OrderedDict
+from contextlib import nullcontext
+
+from PIL import Image, ImageFilter, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# EXIF orientations that rotate the photo by 90 or 270 degrees
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def decode_photo(photo_path, max_side=None):
+    """Decode a photo upright and at just the resolution needed.
+
+    With max_side, JPEGs are decoded with DCT scaling (draft mode) to the
+    smallest size that still covers max_side, then downscaled to fit it.
+    The EXIF orientation is applied here, once per decode. Returns the RGBA
+    image and the upright full-resolution size.
+    """
+
+    with Image.open(photo_path) as image:
+        width, height = image.size
+        if image.getexif().get(0x0112, 1) in TRANSPOSED_ORIENTATIONS:
+            source_size = (height, width)
+        else:
+            source_size = (width, height)
+        if max_side and max(width, height) > max_side:
+            scale = max_side / max(width, height)
+            image.draft(None, (math.ceil(width * scale), math.ceil(height * scale)))
+        layer = ImageOps.exif_transpose(image).convert("RGBA")
+    if max_side and max(layer.size) > max_side:
+        layer.thumbnail((max_side, max_side), Image.LANCZOS)
+    return layer, source_size
+
+
+def image_bytes(image):
+    """Approximate the memory held by a decoded image."""
+
+    return image.width * image.height * len(image.getbands())
+
+
+class LayerCache:
+    """Memory-bounded LRU cache of background layers.
+
+    Layers are keyed by the photo file (path, size and mtime, so a reused
+    path never serves stale pixels) and the blur radius. Blurred layers are
+    derived from the cached base layer, so each photo is decoded once.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._layers = OrderedDict()
+
+    def _file_key(self, photo_path):
+        stat = os.stat(photo_path)
+        return (os.path.abspath(photo_path), stat.st_size, stat.st_mtime_ns)
+
+    def get(self, photo_path, blur_intensity=0, max_side=None, timer=None):
+        """Return the RGBA layer for photo_path blurred by blur_intensity.
+
+        With max_side the layer is a proxy downscaled to fit max_side and the
+        blur radius is scaled with it. The full-resolution size is kept in
+        layer.info["source_size"]. The returned image is shared; callers
+        must copy it before drawing. On a miss, decoding and blurring are
+        timed as the "decode" and "blur" stages of timer, if given.
+        """
+
+        key = (self._file_key(photo_path), max_side, blur_intensity)
+        layer = self._layers.get(key)
+        if layer is not None:
+            self._layers.move_to_end(key)
+            self.hits += 1
+            return layer
+
+        self.misses += 1
+        if blur_intensity > 0:
+            base = self.get(photo_path, 0, max_side, timer)
+            source_size = base.info["source_size"]
+            scale = base.width / source_size[0]
+            with _stage(timer, "blur"):
+                layer = base.filter(ImageFilter.GaussianBlur(radius=blur_intensity * scale))
+        else:
+            with _stage(timer, "decode"):
+                layer, source_size = decode_photo(photo_path, max_side)
+        layer.info["source_size"] = source_size
+        self._put(key, layer)
+        return layer
+
+    def _put(self, key, layer):
+        self._layers[key] = layer
+        self.size_bytes += image_bytes(layer)
+        # Always keep the newest layer, even if it alone exceeds the budget
+        while self.size_bytes > self.max_bytes and len(self._layers) > 1:
+            _, evicted = self._layers.popitem(last=False)
+            self.size_bytes -= image_bytes(evicted)
+
+    def discard(self, photo_path):
+        """Drop every layer derived from photo_path."""
+
+        path = os.path.abspath(photo_path)
+        for key in [key for key in self._layers if key[0][0] == path]:
+            self.size_bytes -= image_bytes(self._layers.pop(key))
+
+    def clear(self):
+        self._layers.clear()
+        self.size_bytes = 0
+
+
+def _stage(timer, name):
+    return timer.stage(name) if timer else nullcontext()
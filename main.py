@@ -1,93 +1,276 @@
+import asyncio
+import io
 import os
 import logging
-import tempfile
 import threading
-from PIL import Image, ImageDraw, ImageFont, ImageColor, ImageFilter
-from pyrogram import Client, filters
+from PIL import ImageColor
+from pyrogram import Client, filters, idle
+from pyrogram.errors import (
+    FileIdInvalid,
+    FileReferenceEmpty,
+    FileReferenceExpired,
+    FileReferenceInvalid,
+    MediaEmpty,
+    MediaInvalid,
+    MessageNotModified,
+)
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message, CallbackQuery, InputMediaPhoto
 from config import Config
-from buttons import get_adjustment_keyboard  # Importing the function from button.py
+from font_registry import registry as font_registry
+from buttons import COLOR_BUTTONS, button_color, get_adjustment_keyboard, get_style_picker_keyboard  # Importing the functions from button.py
+import render
+from scheduler import RenderScheduler
+from admission import PRIORITY_DOWNLOAD, PRIORITY_PREVIEW, AdmissionController, estimate_render_bytes
+from sessions import create_session_store
+from ingest import PhotoIngest
+from result_cache import RenderResultCache, render_key
+from utils import ProgressReporter, progress
+from metrics import DirectorySize, LoopLagMonitor, Metrics, hit_ratio
 from flask import Flask
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# User data store
-user_data_store = {}
-
-# Adjust font size dynamically
-def get_dynamic_font(image, text, max_width, max_height, font_path):
-    draw = ImageDraw.Draw(image)
-    font_size = 100
-    while font_size > 10:
-        font = ImageFont.truetype(font_path, font_size)
-        text_width, text_height = draw.textsize(text, font=font)
-        if text_width <= max_width and text_height <= max_height:
-            return font
-        font_size -= 5
-    return font
-
-# Apply Blur Effect to the Background Image Only (no blur on text)
-async def apply_blur(photo_path, blur_intensity):
-    try:
-        image = Image.open(photo_path).convert("RGBA")
-
-        # Create a blurred version of the background
-        blurred_image = image.filter(ImageFilter.GaussianBlur(radius=blur_intensity))
-
-        # Save the blurred image temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-            blurred_image.save(temp_file, "PNG")
-            return temp_file.name
-    except Exception as e:
-        logger.error(f"Error applying blur: {e}")
-        return None
-
-# Add text to image with adjustments and color (This ensures text is on top of the image, no blur)
-async def add_text_to_image(photo_path, text, output_path, font_path, text_position, size_multiplier, text_color):
-    try:
-        user_image = Image.open(photo_path).convert("RGBA")
-        max_width, max_height = user_image.size
+# User data store (in memory or SQLite): idle sessions expire; their photos live in the photo cache below
+user_data_store = create_session_store(Config.SESSION_BACKEND, Config.SESSION_TTL, Config.MAX_SESSIONS, Config.SESSION_DB, Config.SESSION_FLUSH_INTERVAL)
 
-        # Adjust font size based on size_multiplier
-        font = get_dynamic_font(user_image, text, max_width, max_height, font_path)
-        font = ImageFont.truetype(font_path, int(font.size * size_multiplier))
+# Render engine running the PIL work in worker processes
+render_engine = render.RenderEngine(Config.RENDER_WORKERS)
 
-        draw = ImageDraw.Draw(user_image)
-        text_width, text_height = draw.textsize(text, font=font)
+# Shared blob cache of downloaded photos, keyed by Telegram file_unique_id
+# Photos of live sessions (in any bot process sharing the store) are never evicted
+async def session_photo_paths():
+    return await call_store(user_data_store.photo_paths)
 
-        # Apply position adjustments
-        x = text_position[0]
-        y = text_position[1]
+photo_ingest = PhotoIngest(Config.PHOTO_CACHE_DIR, Config.PHOTO_CACHE_MB * 1024 * 1024, session_photo_paths)
 
-        # Outline effect in white (shadow effect)
-        outline_width = 3
-        for dx in [-outline_width, outline_width]:
-            for dy in [-outline_width, outline_width]:
-                draw.text((x + dx, y + dy), text, font=font, fill="white")
+# Global render queue: concurrency cap, memory budget, downloads before previews, per-user rate limit.
+# RENDER_MEMORY_MB covers all render memory, so the workers' layer caches are taken out of it first.
+render_admission = AdmissionController(
+    Config.RENDER_CONCURRENCY,
+    max(0, Config.RENDER_MEMORY_MB - Config.LAYER_CACHE_MB) * 1024 * 1024,
+    Config.USER_RATE,
+    Config.USER_BURST,
+)
 
-        # Apply main text color
-        draw.text((x, y), text, font=font, fill=text_color)
+# Per-user scheduler coalescing rapid button presses; renders (not presses) are rate-limited per user
+render_scheduler = RenderScheduler(Config.RENDER_DEBOUNCE, render_admission.take_token)
+
+# Finished renders and their Telegram file_ids, keyed by a hash of the render inputs
+result_cache = RenderResultCache(Config.RESULT_CACHE_MB * 1024 * 1024, Config.RESULT_CACHE_ENTRIES)
+
+# Progress messages for downloads and long renders, throttled per message and globally
+progress_reporter = ProgressReporter(Config.PROGRESS_INTERVAL, Config.PROGRESS_EDITS_PER_SECOND)
+
+# Runtime metrics served on /metrics and event loop health served on /healthz
+bot_metrics = Metrics()
+loop_lag = LoopLagMonitor()
+bot_metrics.gauge("logo_renders_in_flight", render_engine.in_flight, "Render jobs running or queued in worker processes.")
+bot_metrics.gauge(
+    "logo_render_queue_depth",
+    lambda: {
+        (("queue", "scheduler"),): render_scheduler.depth(),
+        (("queue", "download"),): render_admission.waiting(PRIORITY_DOWNLOAD),
+        (("queue", "preview"),): render_admission.waiting(PRIORITY_PREVIEW),
+    },
+    "Render requests waiting in the per-user scheduler and in the global render queue.",
+)
+bot_metrics.gauge("logo_render_reserved_bytes", lambda: render_admission.reserved_bytes, "Estimated memory of the renders admitted to run.")
+bot_metrics.gauge("logo_active_sessions", lambda: len(user_data_store), "Sessions in the session store.")
+bot_metrics.gauge("logo_temp_disk_bytes", DirectorySize(Config.PHOTO_CACHE_DIR), "Bytes of downloaded photos on disk.")
+bot_metrics.gauge(
+    "logo_photo_fetches",
+    lambda: {
+        (("result", "hit"),): photo_ingest.hits,
+        (("result", "miss"),): photo_ingest.misses,
+        (("result", "collapsed"),): photo_ingest.collapsed,
+    },
+    "Photo fetches served from the blob cache, downloaded, or joined to a running download.",
+)
+bot_metrics.gauge(
+    "logo_progress_edits",
+    lambda: {(("result", "sent"),): progress_reporter.edits, (("result", "flood_wait"),): progress_reporter.flood_waits},
+    "Progress message edits sent, and edits refused with FloodWait.",
+)
+bot_metrics.gauge("logo_event_loop_lag_seconds", loop_lag.lag, "How late the event loop runs timers.")
+bot_metrics.gauge(
+    "logo_cache_hit_ratio",
+    lambda: {(("cache", cache),): hit_ratio(bot_metrics, cache) for cache in ("layer", "font", "text_mask", "result")},
+    "Share of cache lookups served from cache.",
+)
 
-        # Save the image with text (this should be added after blur is applied to keep text sharp)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-            output_path = temp_file.name
-            user_image.save(output_path, "PNG")
+# Render the logo: blurred background layer (cached per session) plus text on top.
+# Interactive edits render a downscaled JPEG preview; pass preview=False for the full-resolution PNG.
+# Identical earlier renders are served from the result cache; other renders wait for admission to the global queue.
+# The result is an in-memory file that Pyrogram uploads directly.
+# The render arguments and the cache key are taken from one snapshot before the job waits in the queue,
+# since the session dict may change meanwhile and the result must be stored under the state it shows.
+async def render_logo(user_data, preview=True):
+    font_path = user_data.get("font", font_registry.default_font)
+    key = render_key(user_data, preview, font_path)
+    data = result_cache.data(key)
+    if data is not None:
+        bot_metrics.inc("logo_cache_requests_total", (("cache", "result"), ("result", "hit")))
+    else:
+        args = (
+            user_data['photo_path'],
+            user_data['blur_intensity'],
+            user_data['text'],
+            font_path,
+            user_data['text_position'],
+            user_data['size_multiplier'],
+            ImageColor.getrgb(user_data['text_color']),
+            preview,
+        )
+        photo_ingest.touch(user_data['photo_path'])
+        priority = PRIORITY_PREVIEW if preview else PRIORITY_DOWNLOAD
+        nbytes = estimate_render_bytes(user_data['photo_path'], preview, Config.PREVIEW_MAX_SIDE)
+        try:
+            async with render_admission.slot(priority, nbytes):
+                data, stats = await render_engine.run(render.render_logo, *args, key=args[0])
+        except Exception as e:
+            logger.error(f"Error rendering logo: {e}")
+            return None
+        bot_metrics.record_render(stats)
+        bot_metrics.inc("logo_cache_requests_total", (("cache", "result"), ("result", "miss")))
+        result_cache.put(key, data)
+
+    output = io.BytesIO(data)
+    output.name = "logo.jpg" if preview else "logo.png"
+    return output
+
+# Render every font and color variant of the session's logo into one contact sheet (a single batched job)
+async def render_contact_sheet(user_data):
+    key = contact_sheet_key(user_data)
+    data = result_cache.data(key)
+    if data is not None:
+        bot_metrics.inc("logo_cache_requests_total", (("cache", "result"), ("result", "hit")))
+    else:
+        args = (
+            user_data['photo_path'],
+            user_data['blur_intensity'],
+            user_data['text'],
+            font_registry.paths(),
+            [ImageColor.getrgb(color) for _, _, color in COLOR_BUTTONS],
+            user_data['text_position'],
+            user_data['size_multiplier'],
+        )
+        photo_ingest.touch(user_data['photo_path'])
+        nbytes = estimate_render_bytes(user_data['photo_path'], True, Config.PREVIEW_MAX_SIDE)
+        try:
+            async with render_admission.slot(PRIORITY_PREVIEW, nbytes):
+                data, stats = await render_engine.run(render.render_contact_sheet, *args, key=args[0])
+        except Exception as e:
+            logger.error(f"Error rendering contact sheet: {e}")
+            return None
+        bot_metrics.record_render(stats)
+        bot_metrics.inc("logo_cache_requests_total", (("cache", "result"), ("result", "miss")))
+        result_cache.put(key, data)
+
+    output = io.BytesIO(data)
+    output.name = "styles.jpg"
+    return output
+
+# The contact sheet does not depend on the session's current font and color
+def contact_sheet_key(user_data):
+    return render_key(dict(user_data, text_color="*"), "contact_sheet", "*")
+
+# Errors meaning Telegram no longer accepts a cached file_id
+REJECTED_FILE_ID_ERRORS = (
+    FileIdInvalid,
+    FileReferenceEmpty,
+    FileReferenceExpired,
+    FileReferenceInvalid,
+    MediaEmpty,
+    MediaInvalid,
+)
 
-        return output_path
-    except Exception as e:
-        logger.error(f"Error adding text to image: {e}")
+# Send a render with upload(media), which returns the sent message; render() produces the media.
+# If an identical render was uploaded before, its Telegram file_id is sent instead: no render, no upload bytes.
+# Returns the sent message (True if the message already showed this render), or None when the render failed.
+async def send_cached(key, render_output, upload):
+    file_id = result_cache.file_id(key)
+    if file_id:
+        try:
+            with bot_metrics.timer("upload"):
+                message = await upload(file_id)
+            bot_metrics.inc("logo_cache_requests_total", (("cache", "result"), ("result", "hit")))
+            return message
+        except MessageNotModified:
+            # Editing a message to the render it already shows (e.g. presses that cancel out): nothing to do
+            bot_metrics.inc("logo_cache_requests_total", (("cache", "result"), ("result", "hit")))
+            return True
+        except REJECTED_FILE_ID_ERRORS as e:
+            # Only Telegram refusing the file_id itself invalidates it; FloodWait and network errors propagate
+            logger.warning(f"Cached file_id rejected, uploading again: {e}")
+            result_cache.forget_upload(key)
+
+    output = await render_output()
+    if output is None:
         return None
+    with bot_metrics.timer("upload"):
+        message = await upload(output)
+    media = (message.photo or message.document) if message else None
+    if media:
+        result_cache.remember_upload(key, media.file_id)
+    return message
+
+# Render the logo and send it with upload(media)
+async def send_logo(user_data, upload, preview=True):
+    # Snapshot: the session may change while the upload or render is awaited
+    user_data = dict(user_data)
+    key = render_key(user_data, preview, user_data.get("font", font_registry.default_font))
+    return await send_cached(key, lambda: render_logo(user_data, preview), upload)
+
+# Answer a callback right away: with the queue position when the render has to wait for the busy queue, else with text
+async def answer_admission(callback_query, key, priority, text=None):
+    cached = result_cache.file_id(key) or result_cache.data(key) is not None
+    if not cached and render_admission.saturated():
+        text = f"Busy, queued #{render_admission.position(priority)}"
+    await callback_query.answer(text)
+
+PREVIEW_CAPTION = "❖ ʏᴏᴜʀ ʟᴏɢᴏ ᴄʜᴀɴɪɴɢ....!"
+RENDER_FAILED_TEXT = "❖ ʀᴇɴᴅᴇʀɪɴɢ ғᴀɪʟᴇᴅ, ᴘʟᴇᴀsᴇ ᴛʀʏ ᴀɢᴀɪɴ."
+
+# Renders run as tasks of their own, so handlers return at once and Pyrogram's fixed set of
+# handler workers keeps dispatching updates (and "Busy, queued" answers) while renders wait
+background_tasks = set()
+
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(_background_task_done)
+    return task
+
+def _background_task_done(task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background render failed: {task.exception()}")
+
+# Call the session store; a store that may block on its database (SQLite) is called from a thread
+async def call_store(func, *args):
+    if user_data_store.blocking:
+        return await asyncio.to_thread(func, *args)
+    return func(*args)
 
 # Save user data
 async def save_user_data(user_id, data):
-    user_data_store[user_id] = data
+    await call_store(user_data_store.set, user_id, data)
     logger.info(f"User {user_id} data saved: {data}")
 
 # Get user data
 async def get_user_data(user_id):
-    return user_data_store.get(user_id, None)
+    return await call_store(user_data_store.get, user_id)
+
+# Flush buffered session writes and expire idle sessions on a timer, not only when the store is next used
+async def maintain_sessions():
+    while True:
+        await asyncio.sleep(Config.SESSION_FLUSH_INTERVAL)
+        try:
+            await call_store(user_data_store.expire)
+        except Exception as e:
+            logger.error(f"Session maintenance failed: {e}")
 
 # Initialize the Pyrogram Client
 session_name = "logo_creator_bot"
@@ -136,9 +319,17 @@ async def photo_handler(_, message: Message) -> None:
         return await message.reply_text("Please provide a photo under 200MB.")
     try:
         text = await message.reply("❖ ᴘʀᴏᴄᴇssɪɴɢ...")
-        local_path = await media.download()
+        # Resent or forwarded photos come from the shared blob cache instead of a new download
+        try:
+            with bot_metrics.timer("download"):
+                local_path = await photo_ingest.fetch(media, progress=progress, progress_args=(text, progress_reporter))
+        finally:
+            await progress_reporter.finish(text)
+        # A new photo starts a new session; the blob itself is shared and evicted by the blob cache.
+        # The session is saved right away, since only photos of live sessions are safe from eviction.
+        await call_store(user_data_store.discard, message.from_user.id)
+        await save_user_data(message.from_user.id, {'photo_path': local_path, 'photo_id': media.photo.file_unique_id, 'text': '', 'text_position': (0, 0), 'size_multiplier': 1, 'text_color': 'red', 'font': font_registry.default_font, 'blur_intensity': 0})
         await text.edit_text("❖ ᴘʀᴏᴄᴇssɪɴɢ ʏᴏᴜʀ ʟᴏɢᴏ...")
-        await save_user_data(message.from_user.id, {'photo_path': local_path, 'text': '', 'text_position': (0, 0), 'size_multiplier': 1, 'text_color': 'red', 'font': 'fonts/Deadly Advance.ttf', 'blur_intensity': 0})
         await message.reply_text("✎ ɴᴏᴡ sᴇɴᴅ ᴍᴇ ʏᴏᴜʀ ʟᴏɢᴏ ᴛᴇxᴛ.")
     except Exception as e:
         logger.error(e)
@@ -163,21 +354,17 @@ async def text_handler(_, message: Message) -> None:
         return
 
     user_data['text'] = user_text
-    font_path = user_data.get("font", "fonts/Deadly Advance.ttf")
-    text_color = ImageColor.getrgb(user_data['text_color'])
-
-    # Apply blur if needed
-    output_path = user_data['photo_path']
-    if user_data['blur_intensity'] > 0:
-        blurred_image_path = await apply_blur(user_data['photo_path'], user_data['blur_intensity'])
-        if blurred_image_path:
-            output_path = blurred_image_path
+    await save_user_data(user_id, user_data)
 
-    # Now add text to the blurred image (if blurred) or original image
-    output_path = await add_text_to_image(output_path, user_text, None, font_path, user_data['text_position'], user_data['size_multiplier'], text_color)
+    # Blur (if needed) and add text on top of the background
+    async def send_first_preview():
+        sent = await send_logo(user_data, lambda media: message.reply_photo(media, caption=PREVIEW_CAPTION, reply_markup=get_adjustment_keyboard()))
+        if sent is None:
+            await message.reply_text(RENDER_FAILED_TEXT)
+            return
+        await message.delete()
 
-    await message.reply_photo(output_path, caption="❖ ʏᴏᴜʀ ʟᴏɢᴏ ᴄʜᴀɴɪɴɢ....!", reply_markup=get_adjustment_keyboard(output_path))
-    await message.delete()
+    run_in_background(send_first_preview())
 
 @app.on_callback_query()
 async def callback_handler(_, callback_query: CallbackQuery):
@@ -201,32 +388,26 @@ async def callback_handler(_, callback_query: CallbackQuery):
         user_data['size_multiplier'] *= 1.1
     elif callback_query.data == "decrease_size":
         user_data['size_multiplier'] *= 0.9
-    elif callback_query.data == "color_red":
-        user_data['text_color'] = "red"
-    elif callback_query.data == "color_blue":
-        user_data['text_color'] = "blue"
-    elif callback_query.data == "color_green":
-        user_data['text_color'] = "green"
-    elif callback_query.data == "color_black":
-        user_data['text_color'] = "black"
-    elif callback_query.data == "color_yellow":
-        user_data['text_color'] = "yellow"
-    elif callback_query.data == "color_orange":
-        user_data['text_color'] = "orange"
-    elif callback_query.data == "color_purple":
-        user_data['text_color'] = "purple"
+    elif callback_query.data.startswith(("pick_font_", "pick_color_")):
+        # A row (font) or column (color) picked from the contact sheet
+        index = callback_query.data.rsplit("_", 1)[1]
+        font_paths = font_registry.paths()
+        if not index.isdigit():
+            pass
+        elif callback_query.data.startswith("pick_font_") and int(index) < len(font_paths):
+            user_data['font'] = font_paths[int(index)]
+        elif callback_query.data.startswith("pick_color_") and int(index) < len(COLOR_BUTTONS):
+            user_data['text_color'] = COLOR_BUTTONS[int(index)][2]
+
+    # Color selection
+    selected_color = button_color(callback_query.data)
+    if selected_color:
+        user_data['text_color'] = selected_color
 
     # Font selection logic
-    if callback_query.data == "font_deadly_advance_italic":
-        user_data['font'] = "fonts/UTTAM4.otf"
-    elif callback_query.data == "font_deadly_advance":
-        user_data['font'] = "fonts/Deadly Advance.ttf"
-    elif callback_query.data == "font_trick_or_treats":
-        user_data['font'] = "fonts/Trick or Treats.ttf"
-    elif callback_query.data == "font_vampire_wars_italic":
-        user_data['font'] = "fonts/UTTAM3.otf"
-    elif callback_query.data == "font_lobster":
-        user_data['font'] = "fonts/FIGHTBACK.ttf"
+    selected_font = font_registry.button_font(callback_query.data)
+    if selected_font:
+        user_data['font'] = selected_font
 
     # Adjust blur intensity
     if callback_query.data == "blur_plus":
@@ -236,27 +417,71 @@ async def callback_handler(_, callback_query: CallbackQuery):
 
     await save_user_data(user_id, user_data)
 
-    # Regenerate the logo with the new adjustments
-    font_path = user_data.get("font", "fonts/Deadly Advance.ttf")
-    text_color = ImageColor.getrgb(user_data['text_color'])
+    # Only the download is rendered at full resolution
+    if callback_query.data == "download_logo":
+        key = render_key(user_data, False, user_data.get("font", font_registry.default_font))
+        await answer_admission(callback_query, key, PRIORITY_DOWNLOAD, text="Downloading your logo...")
+
+        async def send_download():
+            user_data = await get_user_data(user_id)
+            if not user_data:
+                return
+            # A slow full-resolution render shows its elapsed time in the preview caption
+            sent = await progress_reporter.track(
+                callback_query.message,
+                send_logo(user_data, lambda media: callback_query.message.reply_document(media, caption="【 ᴅᴏᴡɴʟᴏᴀᴅᴇᴅ 】"), preview=False),
+                "❖ ʀᴇɴᴅᴇʀɪɴɢ ʏᴏᴜʀ ʟᴏɢᴏ...",
+                edit=lambda text: callback_query.message.edit_caption(text, reply_markup=get_adjustment_keyboard()),
+            )
+            if sent is None:
+                await callback_query.message.reply_text(RENDER_FAILED_TEXT)
+                # Undo the progress caption; the message is unchanged if the render failed quickly
+                try:
+                    await callback_query.message.edit_caption(PREVIEW_CAPTION, reply_markup=get_adjustment_keyboard())
+                except MessageNotModified:
+                    pass
+                return
+            await callback_query.message.edit_caption(PREVIEW_CAPTION, reply_markup=None)
+            # The logo is done: end the session
+            await call_store(user_data_store.discard, user_id)
+
+        run_in_background(render_scheduler.run(user_id, send_download, coalesce=False))
+        return
 
-    output_path = user_data['photo_path']
-    if user_data['blur_intensity'] > 0:
-        blurred_image_path = await apply_blur(user_data['photo_path'], user_data['blur_intensity'])
-        if blurred_image_path:
-            output_path = blurred_image_path
+    # Show every font and color at once; picking a variant returns to the preview
+    if callback_query.data == "preview_all":
+        await answer_admission(callback_query, contact_sheet_key(user_data), PRIORITY_PREVIEW)
+
+        async def show_styles():
+            user_data = await get_user_data(user_id)
+            if not user_data:
+                return
+            user_data = dict(user_data)
+            sent = await send_cached(
+                contact_sheet_key(user_data),
+                lambda: render_contact_sheet(user_data),
+                lambda media: callback_query.message.edit_media(InputMediaPhoto(media), reply_markup=get_style_picker_keyboard()),
+            )
+            if sent is None:
+                await callback_query.message.reply_text(RENDER_FAILED_TEXT)
+
+        run_in_background(render_scheduler.run(user_id, show_styles))
+        return
 
-    # Now add text to the blurred image (if blurred) or original image
-    output_path = await add_text_to_image(output_path, user_data['text'], None, font_path, user_data['text_position'], user_data['size_multiplier'], text_color)
+    key = render_key(user_data, True, user_data.get("font", font_registry.default_font))
+    await answer_admission(callback_query, key, PRIORITY_PREVIEW)
 
-    await callback_query.message.edit_media(InputMediaPhoto(output_path), reply_markup=get_adjustment_keyboard(output_path))
-    await callback_query.answer()
+    # Regenerate the preview with the new adjustments (text-only edits reuse the cached background layer).
+    # Rapid presses are coalesced so only the latest state is rendered and uploaded.
+    async def update_preview():
+        user_data = await get_user_data(user_id)
+        if not user_data:
+            return
+        sent = await send_logo(user_data, lambda media: callback_query.message.edit_media(InputMediaPhoto(media), reply_markup=get_adjustment_keyboard()))
+        if sent is None:
+            await callback_query.message.reply_text(RENDER_FAILED_TEXT)
 
-    if callback_query.data == "download_logo":
-        await callback_query.answer("Downloading your logo...")
-        with open(output_path, "rb") as file:
-            await callback_query.message.reply_document(file, caption="【 ᴅᴏᴡɴʟᴏᴀᴅᴇᴅ 】")
-        await callback_query.message.edit_reply_markup(reply_markup=None)
+    run_in_background(render_scheduler.run(user_id, update_preview))
 
 # Flask app to listen on port 8000
 app_flask = Flask(__name__)
@@ -265,12 +490,37 @@ app_flask = Flask(__name__)
 def index():
     return "Bot is running."
 
+@app_flask.route("/metrics")
+def prometheus_metrics():
+    return bot_metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+@app_flask.route("/healthz")
+def healthz():
+    lag = loop_lag.lag()
+    healthy = lag < Config.MAX_LOOP_LAG
+    body = {"status": "ok" if healthy else "event loop lagging", "loop_lag_seconds": round(lag, 3)}
+    return body, 200 if healthy else 503
+
 # Run Flask server and the Pyrogram bot concurrently
 def start_flask():
     app_flask.run(host="0.0.0.0", port=8000, threaded=True)
 
+async def run_bot():
+    await app.start()
+    lag_monitor = asyncio.create_task(loop_lag.run())
+    session_maintenance = asyncio.create_task(maintain_sessions())
+    await idle()
+    lag_monitor.cancel()
+    session_maintenance.cancel()
+    await app.stop()
+
 def start_bot():
-    app.run()
+    try:
+        app.run(run_bot())
+    finally:
+        render_engine.shutdown()
+        if hasattr(user_data_store, "close"):
+            user_data_store.close()
 
 if __name__ == "__main__":
     # Run Flask in a separate thread to handle web requests
@@ -0,0 +1,196 @@
+"""
+Module: metrics
+
+This module collects low-overhead runtime metrics (per-stage latency
+histograms, gauges, cache counters and event loop lag) and formats them in
+the Prometheus text exposition format.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from fast cache hits to slow full-resolution renders
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative latency histogram for one label value."""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+class Metrics:
+    """Registry of stage histograms, counters and gauge callbacks.
+
+    Observations are cheap (a bisect and three additions under a lock), so
+    instrumentation can stay enabled in production. Gauges are callables
+    that are only evaluated when /metrics is scraped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """Time the enclosed block as one observation of stage."""
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def inc(self, name, labels=(), amount=1):
+        """Increase the counter name{labels} by amount."""
+
+        key = (name, tuple(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def counter(self, name, labels=()):
+        with self._lock:
+            return self._counters.get((name, tuple(labels)), 0)
+
+    def record_render(self, stats):
+        """Record the stage timings and cache counts returned by a render job."""
+
+        for stage, seconds in stats["stages"].items():
+            self.observe(stage, seconds)
+        for cache, (hits, misses) in stats["caches"].items():
+            self.inc("logo_cache_requests_total", (("cache", cache), ("result", "hit")), hits)
+            self.inc("logo_cache_requests_total", (("cache", cache), ("result", "miss")), misses)
+
+    def gauge(self, name, func, help_text=""):
+        """Register func() as the value of the gauge name."""
+
+        self._gauges[name] = (func, help_text)
+
+    def render(self):
+        """Return all metrics in the Prometheus text format."""
+
+        lines = [
+            "# HELP logo_stage_seconds Latency of each logo pipeline stage.",
+            "# TYPE logo_stage_seconds histogram",
+        ]
+        with self._lock:
+            stages = {stage: (list(h.counts), h.total, h.count) for stage, h in self._stages.items()}
+            counters = dict(self._counters)
+        for stage, (counts, total, count) in sorted(stages.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(f'logo_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'logo_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'logo_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'logo_stage_seconds_count{{stage="{stage}"}} {count}')
+
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {name} counter")
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for name, (func, help_text) in sorted(self._gauges.items()):
+            try:
+                value = func()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.warning(f"Gauge {name} failed: {e}")
+                continue
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            if isinstance(value, dict):
+                for labels, labelled_value in sorted(value.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {labelled_value}")
+            else:
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class LoopLagMonitor:
+    """Measure how late the event loop wakes up a periodic timer.
+
+    If the loop is blocked the monitor cannot run at all, so lag() also
+    counts the time since the last tick beyond the expected interval.
+    """
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.last_lag = 0.0
+        self.last_tick = time.monotonic()
+
+    async def run(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.last_tick = time.monotonic()
+            self.last_lag = max(0.0, self.last_tick - started - self.interval)
+
+    def lag(self):
+        overdue = time.monotonic() - self.last_tick - self.interval
+        return max(self.last_lag, overdue)
+
+
+class DirectorySize:
+    """Total size of the files under a directory, cached for `ttl` seconds."""
+
+    def __init__(self, path, ttl=10.0):
+        self.path = path
+        self.ttl = ttl
+        self._value = 0
+        self._measured = float("-inf")
+
+    def __call__(self):
+        now = time.monotonic()
+        if now - self._measured >= self.ttl:
+            total = 0
+            for root, _, files in os.walk(self.path):
+                for name in files:
+                    try:
+                        total += os.path.getsize(os.path.join(root, name))
+                    except OSError:
+                        pass
+            self._value = total
+            self._measured = now
+        return self._value
+
+
+def hit_ratio(metrics, cache):
+    """Hit ratio of a cache from its logo_cache_requests_total counters."""
+
+    hits = metrics.counter("logo_cache_requests_total", (("cache", cache), ("result", "hit")))
+    misses = metrics.counter("logo_cache_requests_total", (("cache", cache), ("result", "miss")))
+    return round(hits / (hits + misses), 4) if hits + misses else 0
@@ -0,0 +1,302 @@
+"""
+Module: render
+
+This module runs the logo rendering pipeline (background blur, text drawing
+and encoding) off the Pyrogram event loop, on a bounded pool of worker
+processes.
+"""
+
+import asyncio
+import io
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from config import Config
+from font_registry import registry as font_registry
+from layers import LayerCache
+
+logger = logging.getLogger(__name__)
+
+
+# Candidate font sizes for get_dynamic_font, smallest first
+FONT_SIZES = tuple(range(15, 101, 5))
+
+
+@lru_cache(maxsize=256)
+def load_font(font_path, size):
+    """Load a FreeType font once per (font_path, size) in this process.
+
+    Registered fonts are loaded from the registry's in-memory copy.
+    """
+
+    data = font_registry.font_bytes(font_path)
+    return ImageFont.truetype(io.BytesIO(data) if data else font_path, size)
+
+
+@lru_cache(maxsize=4096)
+def text_metrics(font_path, size, text):
+    """Return the (width, height) of text drawn from the origin."""
+
+    _, _, right, bottom = load_font(font_path, size).getbbox(text)
+    return right, bottom
+
+
+# Adjust font size dynamically: binary search for the largest size that fits
+def get_dynamic_font(text, max_width, max_height, font_path):
+    low, high = 0, len(FONT_SIZES) - 1
+    font_size = FONT_SIZES[0]
+    while low <= high:
+        middle = (low + high) // 2
+        text_width, text_height = text_metrics(font_path, FONT_SIZES[middle], text)
+        if text_width <= max_width and text_height <= max_height:
+            font_size = FONT_SIZES[middle]
+            low = middle + 1
+        else:
+            high = middle - 1
+    return load_font(font_path, font_size)
+
+
+# Background layers cached in each worker process; LAYER_CACHE_MB is shared by all workers
+layer_cache = LayerCache(Config.LAYER_CACHE_MB * 1024 * 1024 // max(1, Config.RENDER_WORKERS))
+
+
+class StageTimer:
+    """Accumulate the time spent in each named render stage."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+
+# Draw outlined text on top of the image (in place).
+# source_size is the full-resolution size when image is a downscaled preview;
+# text is sized and placed against it and then scaled down with the image.
+def draw_text(image, text, font_path, text_position, size_multiplier, text_color, source_size=None, timer=None):
+    timer = timer or StageTimer()
+    # Fall back to a font that has glyphs for every character of the text
+    font_path = font_registry.resolve(font_path, text)
+    max_width, max_height = source_size or image.size
+    scale = image.width / max_width
+
+    # Adjust font size based on size_multiplier
+    with timer.stage("font_sizing"):
+        font = get_dynamic_font(text, max_width, max_height, font_path)
+        font = load_font(font_path, max(1, int(font.size * size_multiplier * scale)))
+
+    with timer.stage("text"):
+        _draw_outlined(image, text, font_path, font.size, text_position, text_color, scale)
+
+
+@lru_cache(maxsize=64)
+def text_masks(text, font_path, size, outline_width):
+    """Rasterise text once and derive its outline from the glyph mask.
+
+    Returns (fill_mask, outline_mask, offset): two "L" masks of the same size
+    and the offset of their top-left corner from the text origin. The outline
+    is the fill mask dilated by outline_width pixels, so recoloring or moving
+    the text only needs two paste() calls with the cached masks.
+    """
+
+    font = load_font(font_path, size)
+    left, top, right, bottom = font.getbbox(text)
+    fill_mask = Image.new("L", (right - left + 2 * outline_width, bottom - top + 2 * outline_width), 0)
+    ImageDraw.Draw(fill_mask).text((outline_width - left, outline_width - top), text, font=font, fill=255)
+
+    outline_mask = fill_mask
+    for _ in range(outline_width):
+        outline_mask = outline_mask.filter(ImageFilter.MaxFilter(3))
+    return fill_mask, outline_mask, (left - outline_width, top - outline_width)
+
+
+def _draw_outlined(image, text, font_path, font_size, text_position, text_color, scale):
+    x, y = round(text_position[0] * scale), round(text_position[1] * scale)
+    outline_width = max(1, round(Config.OUTLINE_WIDTH * scale)) if Config.OUTLINE_WIDTH else 0
+    fill_mask, outline_mask, (dx, dy) = text_masks(text, font_path, font_size, outline_width)
+
+    # White outline first, then the main text color on top of it
+    if outline_width:
+        image.paste(Config.OUTLINE_COLOR, (x + dx, y + dy), outline_mask)
+    image.paste(text_color, (x + dx, y + dy), fill_mask)
+
+
+# Encode a rendered image in memory: quality-tuned JPEG for previews, lossless PNG for downloads
+def encode_image(image, preview=True):
+    buffer = io.BytesIO()
+    if preview:
+        image.convert("RGB").save(buffer, "JPEG", quality=Config.PREVIEW_JPEG_QUALITY)
+    else:
+        image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _cache_snapshot():
+    return layer_cache.hits, layer_cache.misses, load_font.cache_info(), text_masks.cache_info()
+
+
+def _render_stats(timer, before):
+    """Stage timings and cache hits and misses since the _cache_snapshot() before."""
+
+    layer_hits, layer_misses, fonts_before, masks_before = before
+    fonts_after = load_font.cache_info()
+    masks_after = text_masks.cache_info()
+    return {
+        "stages": timer.stages,
+        "caches": {
+            "layer": (layer_cache.hits - layer_hits, layer_cache.misses - layer_misses),
+            "font": (fonts_after.hits - fonts_before.hits, fonts_after.misses - fonts_before.misses),
+            "text_mask": (masks_after.hits - masks_before.hits, masks_after.misses - masks_before.misses),
+        },
+    }
+
+
+# Composite the text onto the cached (blurred) background and return the encoded bytes
+# together with per-stage timings and cache hit counts for the metrics endpoint: decode and blur
+# (only on layer cache misses), background (copying the cached layer), font_sizing, text and encode.
+# Previews are rendered on a proxy capped at PREVIEW_MAX_SIDE; downloads at full resolution.
+def render_logo(photo_path, blur_intensity, text, font_path, text_position, size_multiplier, text_color, preview=True):
+    timer = StageTimer()
+    before = _cache_snapshot()
+
+    max_side = Config.PREVIEW_MAX_SIDE if preview else None
+    layer = layer_cache.get(photo_path, blur_intensity, max_side, timer)
+    with timer.stage("background"):
+        image = layer.copy()
+    draw_text(image, text, font_path, text_position, size_multiplier, text_color, layer.info["source_size"], timer)
+    with timer.stage("encode"):
+        data = encode_image(image, preview)
+    return data, _render_stats(timer, before)
+
+
+# Telegram rejects photos whose width plus height exceeds 10000 pixels; tiles shrink to keep the sheet below it
+CONTACT_SHEET_MAX_SIDE = 4800
+
+
+# Render every font (rows, numbered from 1 in a left margin) and color (columns) variant into one
+# JPEG contact sheet. The background is decoded and blurred once and shrunk once to the tile size;
+# each tile only copies it and draws the text, and tiles of one font share its cached masks.
+def render_contact_sheet(photo_path, blur_intensity, text, font_paths, text_colors, text_position, size_multiplier):
+    timer = StageTimer()
+    before = _cache_snapshot()
+
+    tile_side = min(Config.CONTACT_SHEET_TILE, CONTACT_SHEET_MAX_SIDE // max(len(font_paths), len(text_colors), 1))
+    layer = layer_cache.get(photo_path, blur_intensity, Config.PREVIEW_MAX_SIDE, timer)
+    with timer.stage("background"):
+        tile = layer.copy()
+        tile.thumbnail((tile_side, tile_side), Image.LANCZOS)
+    gap = Config.CONTACT_SHEET_GAP
+    label_font = load_font(font_registry.default_font, max(10, tile.height // 3))
+    margin = label_font.size * 2
+    sheet = Image.new(
+        "RGB",
+        (margin + len(text_colors) * (tile.width + gap) + gap, len(font_paths) * (tile.height + gap) + gap),
+        "white",
+    )
+    labels = ImageDraw.Draw(sheet)
+    for row, font_path in enumerate(font_paths):
+        top = gap + row * (tile.height + gap)
+        labels.text((margin // 2, top + tile.height // 2), str(row + 1), font=label_font, fill="black", anchor="mm")
+        for column, text_color in enumerate(text_colors):
+            image = tile.copy()
+            draw_text(image, text, font_path, text_position, size_multiplier, text_color, layer.info["source_size"], timer)
+            sheet.paste(image.convert("RGB"), (margin + gap + column * (tile.width + gap), top))
+    with timer.stage("encode"):
+        data = encode_image(sheet, preview=True)
+    return data, _render_stats(timer, before)
+
+
+# Render a logo at full resolution straight to a PNG file (used by batch jobs)
+def render_logo_file(output_path, photo_path, blur_intensity, text, font_path, text_position, size_multiplier, text_color):
+    data, _ = render_logo(photo_path, blur_intensity, text, font_path, text_position, size_multiplier, text_color, preview=False)
+    with open(output_path, "wb") as output_file:
+        output_file.write(data)
+    return output_path
+
+
+def _mp_context():
+    """Pick a start method that is safe to use from the threaded bot process."""
+
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+class RenderEngine:
+    """Bounded pool of worker processes with an awaitable API.
+
+    Each worker is its own single-process executor so that jobs sharing a
+    key (the session's photo) land on the same process and hit the layer
+    cache it has built up, as long as that worker is idle; otherwise, and
+    for jobs without a key, the least busy worker is used, so a popular
+    photo does not queue on one process while others are free. A worker that dies (for example killed for running out of
+    memory) is replaced and its job retried once.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max(1, max_workers)
+        self._executors = None
+        self._in_flight = [0] * self.max_workers
+
+    def _get_worker(self, key):
+        if self._executors is None:
+            self._executors = [self._new_executor() for _ in range(self.max_workers)]
+        if key is not None:
+            preferred = hash(key) % self.max_workers
+            if not self._in_flight[preferred]:
+                return preferred
+        return min(range(self.max_workers), key=self._in_flight.__getitem__)
+
+    @staticmethod
+    def _new_executor():
+        return ProcessPoolExecutor(max_workers=1, mp_context=_mp_context())
+
+    def _replace_broken(self, worker, executor):
+        # Jobs queued on the same dead worker all fail; only the first one replaces it
+        if self._executors is not None and self._executors[worker] is executor:
+            logger.warning(f"Render worker {worker} died, starting a new one")
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._executors[worker] = self._new_executor()
+
+    async def run(self, func, *args, key=None):
+        """Run func(*args) in a worker process and await its result."""
+
+        loop = asyncio.get_running_loop()
+        worker = self._get_worker(key)
+        self._in_flight[worker] += 1
+        try:
+            for attempt in range(2):
+                executor = self._executors[worker]
+                try:
+                    return await loop.run_in_executor(executor, func, *args)
+                except BrokenProcessPool:
+                    self._replace_broken(worker, executor)
+                    if attempt:
+                        raise
+        finally:
+            self._in_flight[worker] -= 1
+
+    def in_flight(self):
+        """Number of jobs submitted and not yet finished."""
+
+        return sum(self._in_flight)
+
+    def shutdown(self):
+        if self._executors is not None:
+            for executor in self._executors:
+                executor.shutdown(wait=False, cancel_futures=True)
+            self._executors = None
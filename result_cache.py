@@ -0,0 +1,114 @@
+"""
+Module: result_cache
+
+This module caches finished renders by a hash of everything that affects
+the output, together with the Telegram file_id they got when uploaded, so
+toggling back to an earlier state costs neither a render nor an upload.
+"""
+
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def render_key(user_data, preview, font_path):
+    """Hash the render inputs of a session into a cache key.
+
+    The background is identified by Telegram's file_unique_id when known, so
+    the same photo sent by different users shares cache entries.
+    """
+
+    inputs = [
+        user_data.get("photo_id") or user_data["photo_path"],
+        user_data["text"],
+        font_path,
+        user_data["text_color"],
+        list(user_data["text_position"]),
+        round(user_data["size_multiplier"], 6),
+        user_data["blur_intensity"],
+        preview,
+    ]
+    return hashlib.sha256(json.dumps(inputs, ensure_ascii=False).encode()).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("data", "file_id")
+
+    def __init__(self, data=None, file_id=None):
+        self.data = data
+        self.file_id = file_id
+
+
+class RenderResultCache:
+    """LRU of encoded renders and their Telegram file_ids.
+
+    Encoded bytes count against `max_bytes` until the render has been
+    uploaded; after that only the file_id is kept, since sending it again
+    needs no bytes. `max_entries` bounds the number of keys.
+    """
+
+    def __init__(self, max_bytes, max_entries):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.size_bytes = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def file_id(self, key):
+        entry = self._get(key)
+        return entry.file_id if entry else None
+
+    def data(self, key):
+        entry = self._get(key)
+        return entry.data if entry else None
+
+    def put(self, key, data):
+        """Store the encoded bytes of a render."""
+
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry()
+        elif entry.data is not None:
+            self.size_bytes -= len(entry.data)
+        if entry.file_id is None:
+            entry.data = data
+            self.size_bytes += len(data)
+        self._entries.move_to_end(key)
+        self._evict()
+
+    def remember_upload(self, key, file_id):
+        """Record the file_id Telegram gave the uploaded render."""
+
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry()
+        if entry.data is not None:
+            self.size_bytes -= len(entry.data)
+            entry.data = None
+        entry.file_id = file_id
+        self._entries.move_to_end(key)
+        self._evict()
+
+    def forget_upload(self, key):
+        """Drop a file_id that Telegram no longer accepts."""
+
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry.data is not None:
+            self.size_bytes -= len(entry.data)
+
+    def _evict(self):
+        while self._entries and (self.size_bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            _, entry = self._entries.popitem(last=False)
+            if entry.data is not None:
+                self.size_bytes -= len(entry.data)
@@ -0,0 +1,98 @@
+"""
+Module: scheduler
+
+This module coalesces bursts of render requests per user so that only the
+latest state is rendered and uploaded.
+"""
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _Lane:
+    """Render state of a single user."""
+
+    __slots__ = ("generation", "pending", "lock")
+
+    def __init__(self):
+        self.generation = 0
+        self.pending = 0
+        self.lock = asyncio.Lock()
+
+
+class RenderScheduler:
+    """Latest-state-wins render scheduler with one lane per user.
+
+    A request waits `delay` seconds to absorb a burst of presses and is
+    dropped if a newer request for the same user arrived meanwhile. At most
+    one render runs per user at a time, so the newest request is always the
+    last one to render.
+
+    `throttle(user_id)`, if given, rate-limits the jobs that do run: it
+    returns 0 to let a job start, or the seconds to wait before asking
+    again. A job superseded while it waits is dropped.
+    """
+
+    def __init__(self, delay, throttle=None):
+        self.delay = delay
+        self.throttle = throttle
+        self._lanes = {}
+
+    async def _wait_for_turn(self, user_id, superseded):
+        while not superseded():
+            wait = self.throttle(user_id) if self.throttle else 0
+            if not wait:
+                return True
+            await asyncio.sleep(wait)
+        return False
+
+    async def run(self, user_id, job, coalesce=True):
+        """Await job() unless it is superseded; return whether it ran.
+
+        Jobs should read the user's state when they start, not when they are
+        submitted. With coalesce=False the job is never dropped but still
+        waits for the user's running render to finish.
+        """
+
+        lane = self._lanes.get(user_id)
+        if lane is None:
+            lane = self._lanes[user_id] = _Lane()
+        lane.pending += 1
+        try:
+            if not coalesce:
+                async with lane.lock:
+                    await self._wait_for_turn(user_id, lambda: False)
+                    await job()
+                return True
+
+            lane.generation += 1
+            generation = lane.generation
+            if self.delay > 0:
+                await asyncio.sleep(self.delay)
+            if generation != lane.generation:
+                return False
+            async with lane.lock:
+                if not await self._wait_for_turn(user_id, lambda: generation != lane.generation):
+                    return False
+                await job()
+            return True
+        finally:
+            lane.pending -= 1
+            if lane.pending == 0:
+                del self._lanes[user_id]
+
+    def depth(self):
+        """Number of requests waiting behind a debounce or a running render.
+
+        Called from the metrics thread while the event loop changes the lanes,
+        so it works on a snapshot.
+        """
+
+        return sum(lane.pending - lane.lock.locked() for lane in list(self._lanes.values()))
+
+    def active(self):
+        """Number of users with a queued or running render."""
+
+        return len(self._lanes)
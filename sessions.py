@@ -0,0 +1,252 @@
+"""
+Module: sessions
+
+This module stores per-user logo sessions and expires idle ones. Sessions
+live either in process memory or in a local SQLite database shared by every
+bot process on the host. The photos sessions point at belong to the shared
+photo cache (see ingest), not to the sessions.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class _Session:
+    """Data of one user and when it was last used."""
+
+    __slots__ = ("data", "touched")
+
+    def __init__(self, data):
+        self.data = data
+        self.touched = time.monotonic()
+
+
+class MemorySessionStore:
+    """In-memory session store with idle TTL and LRU eviction.
+
+    Sessions idle for longer than `ttl` seconds are expired, and the least
+    recently used session is evicted once more than `max_sessions` exist.
+    Calls never block, so it is used directly from the event loop.
+    """
+
+    # Whether calls may block on I/O and should run off the event loop
+    blocking = False
+
+    def __init__(self, ttl, max_sessions):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, user_id):
+        self.expire()
+        session = self._sessions.get(user_id)
+        if session is None:
+            return None
+        self._touch(user_id, session)
+        return session.data
+
+    def set(self, user_id, data):
+        self.expire()
+        session = self._sessions.get(user_id)
+        if session is None:
+            session = self._sessions[user_id] = _Session(data)
+        else:
+            session.data = data
+        self._touch(user_id, session)
+        while len(self._sessions) > self.max_sessions:
+            evicted_id = next(iter(self._sessions))
+            logger.info(f"Evicting session of user {evicted_id}")
+            self.discard(evicted_id)
+
+    def discard(self, user_id):
+        """End the user's session."""
+
+        self._sessions.pop(user_id, None)
+
+    def photo_paths(self):
+        """Photo paths of all live sessions."""
+
+        self.expire()
+        return {session.data.get("photo_path") for session in self._sessions.values()}
+
+    def expire(self):
+        """Drop every session idle for longer than the TTL."""
+
+        deadline = time.monotonic() - self.ttl
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if session.touched > deadline:
+                break
+            logger.info(f"Session of user {user_id} expired")
+            self.discard(user_id)
+
+    def _touch(self, user_id, session):
+        session.touched = time.monotonic()
+        self._sessions.move_to_end(user_id)
+
+
+class SQLiteSessionStore:
+    """SQLite (WAL) session store shared by bot processes on one host.
+
+    Session data is stored as JSON, one row per user.
+    Writes are buffered and flushed in one transaction by expire(), which
+    the owner must call every `flush_interval` seconds (get() and set() also
+    flush once that much time has passed); reads go through a local cache
+    whose entries are trusted for `cache_ttl` seconds before the database
+    is consulted again. It has the same interface as MemorySessionStore,
+    but calls can wait on the database lock, so they belong in a thread.
+    """
+
+    blocking = True
+
+    def __init__(self, path, ttl, max_sessions, flush_interval=0.5, cache_ttl=1.0):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.flush_interval = flush_interval
+        self.cache_ttl = cache_ttl
+        self._cache = {}
+        self._dirty = set()
+        self._touched = set()
+        self._flushed = time.monotonic()
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                user_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL,
+                touched REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS sessions_touched ON sessions (touched);
+            """
+        )
+
+    def __len__(self):
+        with self._lock:
+            self.flush()
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def get(self, user_id):
+        with self._lock:
+            self._maybe_flush()
+            cached = self._cache.get(user_id)
+            if cached is not None and (user_id in self._dirty or time.monotonic() - cached[1] < self.cache_ttl):
+                data = cached[0]
+            else:
+                row = self._db.execute(
+                    "SELECT data, touched FROM sessions WHERE user_id = ?", (user_id,)
+                ).fetchone()
+                if row is None or row[1] < time.time() - self.ttl:
+                    self._cache.pop(user_id, None)
+                    return None
+                data = _decode(row[0])
+                self._cache[user_id] = (data, time.monotonic())
+            self._touched.add(user_id)
+            return data
+
+    def set(self, user_id, data):
+        with self._lock:
+            self._cache[user_id] = (data, time.monotonic())
+            self._dirty.add(user_id)
+            self._maybe_flush()
+
+    def discard(self, user_id):
+        """End the user's session."""
+
+        with self._lock:
+            self._cache.pop(user_id, None)
+            self._dirty.discard(user_id)
+            self._touched.discard(user_id)
+            self._db.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    def photo_paths(self):
+        """Photo paths of all live sessions, of every process using the database."""
+
+        with self._lock:
+            self.flush()
+            rows = self._db.execute(
+                "SELECT DISTINCT json_extract(data, '$.photo_path') FROM sessions WHERE touched >= ?",
+                (time.time() - self.ttl,),
+            )
+            return {row[0] for row in rows}
+
+    def expire(self):
+        """Drop idle sessions and the oldest ones beyond max_sessions."""
+
+        with self._lock:
+            self.flush()
+            expired = self._db.execute(
+                "SELECT user_id FROM sessions WHERE touched < ?", (time.time() - self.ttl,)
+            ).fetchall()
+            evicted = self._db.execute(
+                "SELECT user_id FROM sessions ORDER BY touched DESC LIMIT -1 OFFSET ?", (self.max_sessions,)
+            ).fetchall()
+            for user_id in {row[0] for row in expired + evicted}:
+                logger.info(f"Session of user {user_id} expired")
+                self.discard(user_id)
+            # Forget cached copies that would be re-read from the database anyway
+            now = time.monotonic()
+            for user_id in [user_id for user_id, (_, loaded) in self._cache.items() if now - loaded >= self.cache_ttl]:
+                del self._cache[user_id]
+
+    def flush(self):
+        """Write buffered session changes in a single transaction."""
+
+        with self._lock:
+            self._flushed = time.monotonic()
+            if not self._dirty and not self._touched:
+                return
+            now = time.time()
+            rows = [
+                (user_id, json.dumps(self._cache[user_id][0]), now)
+                for user_id in self._dirty if user_id in self._cache
+            ]
+            # Reads only refresh the idle timer, so they never overwrite another process's writes
+            touched = [(now, user_id) for user_id in self._touched - self._dirty]
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO sessions (user_id, data, touched) VALUES (?, ?, ?)", rows
+            )
+            self._db.executemany("UPDATE sessions SET touched = ? WHERE user_id = ?", touched)
+            self._db.execute("COMMIT")
+            self._dirty.clear()
+            self._touched.clear()
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._db.close()
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._flushed >= self.flush_interval:
+            self.expire()
+
+
+def create_session_store(backend, ttl, max_sessions, path=None, flush_interval=0.5):
+    """Create the session store selected by the SESSION_BACKEND setting."""
+
+    if backend == "memory":
+        return MemorySessionStore(ttl, max_sessions)
+    if backend == "sqlite":
+        return SQLiteSessionStore(path, ttl, max_sessions, flush_interval)
+    raise ValueError(f"Unknown session backend: {backend}")
+
+
+def _decode(raw):
+    data = json.loads(raw)
+    # JSON has no tuples; positions are stored as lists
+    if isinstance(data.get("text_position"), list):
+        data["text_position"] = tuple(data["text_position"])
+    return data
+
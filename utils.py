@@ -1,28 +1,137 @@
 """
 Module: progress_utils
 
-This module provides utilities for displaying progress while downloading.
+This module provides utilities for displaying progress while downloading
+or rendering.
 """
 
+import asyncio
 import logging
 import time
 import math
 
+from pyrogram.errors import FloodWait
+
 logger = logging.getLogger(__name__)
 
 
-async def progress(done, total, message, start_time):
-    """Display progress while downloading."""
+def progress_text(done, total):
+    """Progress bar with the transferred and total size."""
 
-    present = time.time()
-    percentage = done * 100 / total
+    percentage = done * 100 / total if total else 100
     progressbar = f"[{'▪️' * math.floor(percentage/10)}{'▫️' * (10 - math.floor(percentage/10))}]"
-    text = progressbar + f"\n{human_redable(done)} of {human_redable(total)}"
-    if round((present - start_time) % 3) == 0 or done == total:
+    return progressbar + f"\n{human_redable(done)} of {human_redable(total)}"
+
+
+async def progress(done, total, message, reporter):
+    """Display progress while downloading.
+
+    Pass as `progress=progress, progress_args=(message, reporter)`; the
+    reporter decides whether this update is actually sent.
+    """
+
+    reporter.update(message, progress_text(done, total))
+
+
+class _ProgressState:
+    """Latest progress of one message."""
+
+    __slots__ = ("text", "sent", "last_edit", "edit", "task")
+
+    def __init__(self):
+        self.text = None
+        self.sent = None
+        self.last_edit = float("-inf")
+        self.edit = None
+        self.task = None
+
+
+class ProgressReporter:
+    """Throttled, flood-safe progress messages.
+
+    Updates of one message are coalesced: at most one edit per
+    `min_interval` seconds is sent, carrying the latest text, and never two
+    at once. All messages share a budget of `edits_per_second` edits, and
+    after a FloodWait no edit is sent until it has passed. Updates that
+    cannot be sent are dropped, so the callers never wait for Telegram and
+    progress costs a bounded number of API calls however many users are
+    active.
+    """
+
+    def __init__(self, min_interval=3.0, edits_per_second=10.0):
+        self.min_interval = min_interval
+        self.edits_per_second = edits_per_second
+        self.edits = 0
+        self.flood_waits = 0
+        self._states = {}
+        self._tokens = edits_per_second
+        self._refilled = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _take_token(self, now):
+        self._tokens = min(self.edits_per_second, self._tokens + (now - self._refilled) * self.edits_per_second)
+        self._refilled = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def update(self, message, text, edit=None):
+        """Show text on message if the throttles allow it, else drop it.
+
+        edit(text) performs the edit and defaults to message.edit_text.
+        """
+
+        state = self._states.get((message.chat.id, message.id))
+        if state is None:
+            state = self._states[(message.chat.id, message.id)] = _ProgressState()
+        state.text = text
+        state.edit = edit or message.edit_text
+        now = time.monotonic()
+        if state.task is not None or text == state.sent or now - state.last_edit < self.min_interval:
+            return
+        if now < self._blocked_until or not self._take_token(now):
+            return
+        state.last_edit = now
+        state.task = asyncio.ensure_future(self._send(state))
+
+    async def _send(self, state):
+        text = state.text
         try:
-            await message.edit(text)
-        except Exception as e: # pylint: disable=broad-exception-caught
+            await state.edit(text)
+            state.sent = text
+            self.edits += 1
+        except FloodWait as e:
+            self.flood_waits += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + e.value)
+            logger.warning(f"Progress edits paused for {e.value}s after FloodWait")
+        except Exception as e:  # pylint: disable=broad-exception-caught
             logger.warning(e)
+        finally:
+            state.task = None
+
+    async def finish(self, message):
+        """Forget message, waiting for its edit in flight so later edits are not overwritten."""
+
+        state = self._states.pop((message.chat.id, message.id), None)
+        if state is not None and state.task is not None:
+            await asyncio.wait({state.task})
+
+    async def track(self, message, awaitable, label, edit=None):
+        """Await awaitable, showing "label Ns" on message while it takes long."""
+
+        task = asyncio.ensure_future(awaitable)
+        started = time.monotonic()
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=self.min_interval)
+                if done:
+                    return task.result()
+                self.update(message, f"{label} {round(time.monotonic() - started)}s", edit)
+        finally:
+            if not task.done():
+                task.cancel()
+            await self.finish(message)
 
 
 def human_redable(size):